@@ -3,34 +3,148 @@ import os
 import sys
 import json
 import argparse
+import concurrent.futures
+import dataclasses
+import operator
 import re
 import datetime
+import http.client
+import io
+import threading
 import time
 import urllib.parse
 import urllib.request
 import urllib.error
-from py_clob_client.clob_types import (
-    AssetType,
-    BalanceAllowanceParams,
-    OrderArgs,
-    OrderType,
-    TradeParams,
-)
-from py_clob_client.order_builder.constants import BUY, SELL
+from decimal import Decimal, InvalidOperation, ROUND_DOWN
 
 from . import __version__
 from .client import get_client_or_exit
+from .config import load_env_file
 
-def _http_get_json(url, timeout=15):
-    req = urllib.request.Request(
-        url,
-        headers={"User-Agent": f"polymarket-trader/{__version__}"},
-    )
+# Optional speedups: orjson, then ujson; stdlib json is the fallback.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+    try:
+        import ujson
+    except ImportError:
+        ujson = None
+else:
+    ujson = None
+
+
+def _emit(obj):
+    data = None
+    if orjson is not None:
+        try:
+            data = orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE)
+        except TypeError:
+            # orjson rejects ints beyond 64 bits (e.g. uint256 allowances)
+            pass
+    elif ujson is not None:
+        try:
+            text = ujson.dumps(obj, indent=2, escape_forward_slashes=False)
+            data = (text + "\n").encode()
+        except (TypeError, OverflowError):
+            pass
+    if data is None:
+        data = (json.dumps(obj, indent=2) + "\n").encode()
+    out = getattr(sys.stdout, "buffer", None)
+    if out is None:
+        sys.stdout.write(data.decode())
+        return
+    sys.stdout.flush()
+    out.write(data)
+
+
+def _dumps_bytes(obj):
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            pass
+    elif ujson is not None:
+        try:
+            return ujson.dumps(obj, escape_forward_slashes=False).encode()
+        except (TypeError, OverflowError):
+            pass
+    return json.dumps(obj).encode()
+
+
+def _loads(raw):
+    # Decode errors from every backend are ValueError subclasses.
+    if orjson is not None:
+        return orjson.loads(raw)
+    if ujson is not None:
+        return ujson.loads(raw)
+    return json.loads(raw)
+
+
+_HTTP_LOCAL = threading.local()
+
+
+def _http_request(url, data=None, headers=None, timeout=15):
+    # Keep one connection alive per thread and host so sequential calls on the
+    # same thread (Gamma pagination, title batches, per-call RPC fallbacks)
+    # skip the TCP/TLS handshake. Proxied URLs and redirects are left to urllib.
+    headers = {"User-Agent": f"polymarket-trader/{__version__}", **(headers or {})}
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme not in ("http", "https") or urllib.request.getproxies().get(parts.scheme):
+        return _urllib_request(url, data, headers, timeout)
+    conns = getattr(_HTTP_LOCAL, "conns", None)
+    if conns is None:
+        conns = _HTTP_LOCAL.conns = {}
+    key = (parts.scheme, parts.netloc)
+    path = urllib.parse.urlunsplit(("", "", parts.path or "/", parts.query, ""))
+    method = "POST" if data is not None else "GET"
+    while True:
+        conn = conns.get(key)
+        reused = conn is not None
+        if conn is None:
+            if parts.scheme == "https":
+                conn = http.client.HTTPSConnection(parts.netloc, timeout=timeout)
+            else:
+                conn = http.client.HTTPConnection(parts.netloc, timeout=timeout)
+            conns[key] = conn
+        else:
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+        try:
+            conn.request(method, path, body=data, headers=headers)
+            resp = conn.getresponse()
+            body = resp.read()
+        except (http.client.HTTPException, OSError) as exc:
+            conn.close()
+            conns.pop(key, None)
+            dropped = isinstance(exc, (ConnectionResetError, BrokenPipeError))
+            if reused and dropped and not isinstance(exc, TimeoutError):
+                # Server dropped the idle keep-alive connection; retry on a fresh one.
+                continue
+            raise
+        if resp.will_close:
+            conn.close()
+            conns.pop(key, None)
+        break
+    if 300 <= resp.status < 400:
+        return _urllib_request(url, data, headers, timeout)
+    if resp.status >= 400:
+        raise urllib.error.HTTPError(url, resp.status, resp.reason, resp.headers, io.BytesIO(body))
+    return body
+
+
+def _urllib_request(url, data, headers, timeout):
+    req = urllib.request.Request(url, data=data, headers=headers)
     with urllib.request.urlopen(req, timeout=timeout) as resp:
-        raw = resp.read().decode()
+        return resp.read()
+
+
+def _http_get_json(url, timeout=15):
+    raw = _http_request(url, timeout=timeout)
     try:
-        return json.loads(raw)
-    except json.JSONDecodeError:
+        return _loads(raw)
+    except ValueError:
         raise ValueError("non-JSON response")
 
 def _parse_kv_params(kv_list):
@@ -62,8 +176,8 @@ def _parse_token_ids(raw):
         return raw
     if isinstance(raw, str):
         try:
-            return json.loads(raw)
-        except json.JSONDecodeError:
+            return _loads(raw)
+        except ValueError:
             return [raw]
     return None
 
@@ -79,6 +193,52 @@ def _title_from_item(item):
         or item.get("name")
     )
 
+_TITLE_BATCH_SIZE = 50
+_FETCH_WORKERS = 16
+
+
+def _gamma_titles(condition_ids):
+    base = os.getenv("POLYMARKET_GAMMA_HOST", "https://gamma-api.polymarket.com")
+    params = {"condition_ids": condition_ids, "limit": str(len(condition_ids))}
+    url = base.rstrip("/") + "/markets?" + urllib.parse.urlencode(params, doseq=True)
+    resp = _http_get_json(url, timeout=15)
+    if isinstance(resp, dict):
+        resp = resp.get("data") or resp.get("markets") or []
+    titles = {}
+    for m in resp if isinstance(resp, list) else []:
+        if not isinstance(m, dict):
+            continue
+        condition_id = m.get("conditionId") or m.get("condition_id")
+        title = _title_from_item(m)
+        if condition_id and title:
+            titles[condition_id] = title
+    return titles
+
+
+def _fetch_titles(client, condition_ids):
+    ids = [cid for cid in dict.fromkeys(condition_ids) if cid]
+    if not ids:
+        return {}
+    # One Gamma request covers the whole batch; anything it misses (or all of
+    # it, if Gamma is unavailable) falls back to concurrent CLOB lookups.
+    try:
+        titles = _gamma_titles(ids)
+    except Exception:
+        titles = {}
+
+    def _one(condition_id):
+        try:
+            return _title_from_item(client.get_market(condition_id))
+        except Exception:
+            return None
+
+    missing = [cid for cid in ids if cid not in titles]
+    if missing:
+        workers = min(_FETCH_WORKERS, len(missing))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            titles.update(zip(missing, pool.map(_one, missing)))
+    return titles
+
 def _split_terms(raw):
     if not raw:
         return []
@@ -162,10 +322,22 @@ def _within_hours(dt, hours):
     delta = dt - now
     return datetime.timedelta(0) <= delta <= datetime.timedelta(hours=hours)
 
+def _order_price(order):
+    # Parsed once per order; quote/buy-max reuse it after the best-order scan.
+    price = getattr(order, "_price_f", None)
+    if price is None:
+        price = float(order.price)
+        order._price_f = price
+    return price
+
+
 def _best_order(orders, best_fn):
     if not orders:
         return None
-    return best_fn(orders, key=lambda x: float(x.price))
+    prices = map(float, map(operator.attrgetter("price"), orders))
+    price, best = best_fn(zip(prices, orders), key=operator.itemgetter(0))
+    best._price_f = price
+    return best
 
 
 def _best_bid_ask(book):
@@ -175,6 +347,8 @@ def _best_bid_ask(book):
 
 
 def _get_balance_allowance(client, token_id=None):
+    from py_clob_client.clob_types import AssetType, BalanceAllowanceParams
+
     params = BalanceAllowanceParams(asset_type=AssetType.COLLATERAL)
     if token_id:
         params.token_id = token_id
@@ -187,32 +361,99 @@ def _max_allowance(allowances):
     return max(float(v) for v in allowances.values())
 
 
-def _rpc_allowance(rpc_url, owner, spender, token):
-    selector = "0xdd62ed3e"  # allowance(address,address)
+def _preflight_balance_allowance(client):
+    try:
+        bal = _get_balance_allowance(client)
+        balance = float(bal.get("balance", 0))
+        max_allow = _max_allowance(bal.get("allowances"))
+        if balance <= 0 or max_allow <= 0:
+            raise ValueError(
+                "insufficient balance/allowance (balance or allowance is 0)"
+            )
+    except Exception as e:
+        print(
+            f"Warning: could not preflight balance/allowance: {e}",
+            file=sys.stderr,
+        )
+
+
+def _rpc_post(rpc_url, payload):
+    return _http_request(
+        rpc_url,
+        data=_dumps_bytes(payload),
+        headers={"Content-Type": "application/json"},
+        timeout=10,
+    )
+
+
+def _pad_address(addr):
+    # Plain str ops: a bytes round-trip measured slower (encode + final decode).
+    return addr.lower().removeprefix("0x").rjust(64, "0")
 
-    def _pad(addr):
-        return addr.lower().replace("0x", "").rjust(64, "0")
 
-    call_data = selector + _pad(owner) + _pad(spender)
-    payload = {
+def _eth_call_payload(request_id, to, call_data):
+    return {
         "jsonrpc": "2.0",
-        "id": 1,
+        "id": request_id,
         "method": "eth_call",
-        "params": [{"to": token, "data": call_data}, "latest"],
+        "params": [{"to": to, "data": call_data}, "latest"],
     }
-    req = urllib.request.Request(
-        rpc_url, data=json.dumps(payload).encode(), headers={"Content-Type": "application/json"}
-    )
-    with urllib.request.urlopen(req, timeout=10) as resp:
-        data = json.loads(resp.read().decode())
+
+
+def _rpc_eth_call(rpc_url, to, call_data):
+    data = _loads(_rpc_post(rpc_url, _eth_call_payload(1, to, call_data)))
     if "result" not in data:
         raise ValueError(f"rpc error: {data}")
     return int(data["result"], 16)
 
+
+def _rpc_eth_call_batch(rpc_url, to, calls):
+    payload = [_eth_call_payload(i, to, call_data) for i, call_data in enumerate(calls)]
+    data = _loads(_rpc_post(rpc_url, payload))
+    if not isinstance(data, list):
+        raise ValueError(f"rpc batch error: {data}")
+    results = {}
+    for item in data:
+        if not isinstance(item, dict) or "result" not in item:
+            continue
+        idx = item.get("id")
+        if isinstance(idx, int) and 0 <= idx < len(calls):
+            results[idx] = int(item["result"], 16)
+    return results
+
+
+def _rpc_allowance_many(rpc_url, owner, spenders, token):
+    # allowance(address,address) selector + owner are shared by every call.
+    prefix = "0xdd62ed3e" + _pad_address(owner)
+    calls = [prefix + _pad_address(spender) for spender in spenders]
+    try:
+        results = _rpc_eth_call_batch(rpc_url, token, calls)
+    except Exception:
+        # Some RPC providers reject JSON-RPC batches; query spenders individually.
+        results = {}
+
+    def _one(idx):
+        try:
+            return _rpc_eth_call(rpc_url, token, calls[idx])
+        except Exception as e:
+            return f"error: {e}"
+
+    missing = [i for i in range(len(calls)) if i not in results]
+    if missing:
+        workers = min(_FETCH_WORKERS, len(missing))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            results.update(zip(missing, pool.map(_one, missing)))
+    return {spender: results[i] for i, spender in enumerate(spenders)}
+
 def _to_json_payload(obj):
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        # Direct conversion instead of parsing the string built by obj.json.
+        # (Not handed to orjson as-is: client types override __dict__, which
+        # orjson's dataclass support does not handle.)
+        return dataclasses.asdict(obj)
     if hasattr(obj, "json"):
         try:
-            return json.loads(obj.json)
+            return _loads(obj.json)
         except Exception:
             return obj.json
     if hasattr(obj, "__dict__"):
@@ -234,23 +475,9 @@ def _trade_matches_order(trade, order_id):
     return False
 
 
-def _rpc_tx_receipt(rpc_url, tx_hash):
-    if not rpc_url:
-        return None
-    payload = {
-        "jsonrpc": "2.0",
-        "id": 1,
-        "method": "eth_getTransactionReceipt",
-        "params": [tx_hash],
-    }
-    req = urllib.request.Request(
-        rpc_url, data=json.dumps(payload).encode(), headers={"Content-Type": "application/json"}
-    )
-    with urllib.request.urlopen(req, timeout=10) as resp:
-        data = json.loads(resp.read().decode())
-    if "result" not in data or data["result"] is None:
+def _receipt_summary(tx_hash, receipt):
+    if receipt is None:
         return {"transaction_hash": tx_hash, "status": "pending"}
-    receipt = data["result"]
     status_hex = receipt.get("status")
     status = "unknown"
     if status_hex is not None:
@@ -265,6 +492,56 @@ def _rpc_tx_receipt(rpc_url, tx_hash):
     }
 
 
+def _receipt_payload(request_id, tx_hash):
+    return {
+        "jsonrpc": "2.0",
+        "id": request_id,
+        "method": "eth_getTransactionReceipt",
+        "params": [tx_hash],
+    }
+
+
+def _rpc_tx_receipt(rpc_url, tx_hash):
+    if not rpc_url:
+        return None
+    data = _loads(_rpc_post(rpc_url, _receipt_payload(1, tx_hash)))
+    return _receipt_summary(tx_hash, data.get("result"))
+
+
+def _rpc_tx_receipts(rpc_url, tx_hashes):
+    unique = list(dict.fromkeys(tx_hashes))
+    if not unique:
+        return []
+    by_hash = {}
+    if rpc_url:
+        # One JSON-RPC batch for all receipts (once per hash).
+        payload = [_receipt_payload(i, tx_hash) for i, tx_hash in enumerate(unique)]
+        try:
+            data = _loads(_rpc_post(rpc_url, payload))
+        except Exception:
+            data = None
+        for item in data if isinstance(data, list) else []:
+            if not isinstance(item, dict) or "result" not in item:
+                continue
+            idx = item.get("id")
+            if isinstance(idx, int) and 0 <= idx < len(unique):
+                try:
+                    by_hash[unique[idx]] = _receipt_summary(unique[idx], item["result"])
+                except Exception:
+                    continue
+
+    # Batch rejected or entries missing: query those hashes one by one.
+    for tx_hash in unique:
+        if tx_hash in by_hash:
+            continue
+        try:
+            rec = _rpc_tx_receipt(rpc_url, tx_hash)
+        except Exception as e:
+            rec = {"transaction_hash": tx_hash, "status": "error", "error": str(e)}
+        by_hash[tx_hash] = rec or {"transaction_hash": tx_hash, "status": "unknown"}
+    return [by_hash[tx_hash] for tx_hash in tx_hashes]
+
+
 def cmd_markets(args):
     client = get_client_or_exit(require_auth=False)
     try:
@@ -303,7 +580,10 @@ def cmd_markets(args):
         # Simplification: Fetch specific market if ID provided, or search/list top
         if args.id:
             market = client.get_market(args.id)
-            print(json.dumps(market, indent=2))
+            if args.fields and isinstance(market, dict):
+                fields = [f.strip() for f in args.fields.split(",") if f.strip()]
+                market = _select_fields(market, fields)
+            _emit(market)
         else:
             # Listing all markets can be huge. Just returning a message or implementing search if library supports it.
             # The library has get_markets() but it might return a lot.
@@ -337,6 +617,9 @@ def cmd_markets(args):
                 fields = [f.strip() for f in args.fields.split(",") if f.strip()]
                 if "title" in fields:
                     args.with_title = True
+                elif not title_filters:
+                    # Titles would be projected away; skip the detail lookups.
+                    args.with_title = False
             all_items = []
             max_results = args.limit
             next_cursor = None
@@ -403,25 +686,38 @@ def cmd_markets(args):
                     return client.get_simplified_markets()
 
                 pages = 0
+                fetch_titles = args.with_title or args.title_like
                 while True:
                     resp = _get_page(next_cursor)
-                    items = resp.get("data", [])
-                    for m in items:
-                        if args.accepting_only and not m.get("accepting_orders"):
-                            continue
-                        title_val = None
-                        if args.with_title or args.title_like:
-                            condition_id = m.get("condition_id")
-                            if condition_id:
-                                try:
-                                    detail = client.get_market(condition_id)
-                                    title_val = _title_from_item(detail)
-                                except Exception:
-                                    title_val = None
-                            m["title"] = title_val
-                        if not _match_title(title_val, args):
-                            continue
-                        all_items.append(m)
+                    items = [
+                        m
+                        for m in resp.get("data", [])
+                        if not (args.accepting_only and not m.get("accepting_orders"))
+                    ]
+                    pos = 0
+                    while pos < len(items):
+                        step = len(items)
+                        if fetch_titles:
+                            # Resolve titles in batches so a --limit stops us
+                            # early instead of resolving the whole page.
+                            step = _TITLE_BATCH_SIZE
+                            if max_results and not title_filters:
+                                step = min(step, max_results - len(all_items))
+                        chunk = items[pos : pos + step]
+                        pos += step
+                        titles = {}
+                        if fetch_titles:
+                            titles = _fetch_titles(client, [m.get("condition_id") for m in chunk])
+                        for m in chunk:
+                            title_val = None
+                            if fetch_titles:
+                                title_val = titles.get(m.get("condition_id"))
+                                m["title"] = title_val
+                            if not _match_title(title_val, args):
+                                continue
+                            all_items.append(m)
+                            if max_results and len(all_items) >= max_results:
+                                break
                         if max_results and len(all_items) >= max_results:
                             break
                     pages += 1
@@ -433,7 +729,7 @@ def cmd_markets(args):
             if fields:
                 all_items = [_select_fields(m, fields) for m in all_items]
             if args.compact:
-                print(json.dumps(all_items, indent=2))
+                _emit(all_items)
             else:
                 out = {
                     "data": all_items,
@@ -441,7 +737,7 @@ def cmd_markets(args):
                 }
                 if next_cursor:
                     out["next_cursor"] = next_cursor
-                print(json.dumps(out, indent=2))
+                _emit(out)
     except Exception as e:
         print(f"Error fetching markets: {e}", file=sys.stderr)
 
@@ -574,18 +870,18 @@ def cmd_gamma(args):
             if fields:
                 items = [_select_fields(m, fields) if isinstance(m, dict) else m for m in items]
             if args.compact:
-                print(json.dumps(items, indent=2))
+                _emit(items)
             else:
                 if isinstance(resp, dict):
                     if items_key:
                         resp[items_key] = items
                     else:
                         resp["data"] = items
-                    print(json.dumps(resp, indent=2))
+                    _emit(resp)
                 else:
-                    print(json.dumps(items, indent=2))
+                    _emit(items)
         else:
-            print(json.dumps(resp, indent=2))
+            _emit(resp)
     except Exception as e:
         print(f"Error fetching gamma data: {e}", file=sys.stderr)
 
@@ -597,29 +893,21 @@ def cmd_orderbook(args):
         if isinstance(payload, str):
             print(payload)
         else:
-            print(json.dumps(payload, indent=2))
+            _emit(payload)
     except Exception as e:
         print(f"Error fetching orderbook: {e}", file=sys.stderr)
 
 def cmd_buy(args):
+    from py_clob_client.clob_types import OrderArgs, OrderType
+    from py_clob_client.order_builder.constants import BUY
+
     client = get_client_or_exit(require_auth=True)
     try:
         price = float(args.price)
         size = float(args.size)
 
-        try:
-            bal = _get_balance_allowance(client)
-            balance = float(bal.get("balance", 0))
-            max_allow = _max_allowance(bal.get("allowances"))
-            if balance <= 0 or max_allow <= 0:
-                raise ValueError(
-                    "insufficient balance/allowance (balance or allowance is 0)"
-                )
-        except Exception as e:
-            print(
-                f"Warning: could not preflight balance/allowance: {e}",
-                file=sys.stderr,
-            )
+        if not args.no_preflight:
+            _preflight_balance_allowance(client)
         
         order_args = OrderArgs(
             price=price,
@@ -629,11 +917,14 @@ def cmd_buy(args):
         )
         signed_order = client.create_order(order_args)
         resp = client.post_order(signed_order, OrderType.GTC)
-        print(json.dumps(resp, indent=2))
+        _emit(resp)
     except Exception as e:
         print(f"Error placing buy order: {e}", file=sys.stderr)
 
 def cmd_sell(args):
+    from py_clob_client.clob_types import OrderArgs, OrderType
+    from py_clob_client.order_builder.constants import SELL
+
     client = get_client_or_exit(require_auth=True)
     try:
         price = float(args.price)
@@ -647,7 +938,7 @@ def cmd_sell(args):
         )
         signed_order = client.create_order(order_args)
         resp = client.post_order(signed_order, OrderType.GTC)
-        print(json.dumps(resp, indent=2))
+        _emit(resp)
     except Exception as e:
         print(f"Error placing sell order: {e}", file=sys.stderr)
 
@@ -664,12 +955,14 @@ def cmd_cancel(args):
             resp = client.cancel_all()
         else:
             resp = client.cancel(args.order_id)
-        print(json.dumps(resp, indent=2))
+        _emit(resp)
     except Exception as e:
         print(f"Error canceling order: {e}", file=sys.stderr)
 
 
 def _fetch_order_status(client, order_id, include_trades=True, include_receipts=False):
+    from py_clob_client.clob_types import TradeParams
+
     order = client.get_order(order_id)
     order_payload = _to_json_payload(order)
     maker_address = None
@@ -698,16 +991,12 @@ def _fetch_order_status(client, order_id, include_trades=True, include_receipts=
 
         if include_receipts:
             rpc_url = os.getenv("POLYMARKET_RPC")
-            receipts = []
-            for trade in matched:
-                tx_hash = trade.get("transaction_hash") if isinstance(trade, dict) else None
-                if tx_hash:
-                    try:
-                        rec = _rpc_tx_receipt(rpc_url, tx_hash)
-                    except Exception as e:
-                        rec = {"transaction_hash": tx_hash, "status": "error", "error": str(e)}
-                    receipts.append(rec or {"transaction_hash": tx_hash, "status": "unknown"})
-            result["receipts"] = receipts
+            tx_hashes = [
+                trade.get("transaction_hash")
+                for trade in matched
+                if isinstance(trade, dict) and trade.get("transaction_hash")
+            ]
+            result["receipts"] = _rpc_tx_receipts(rpc_url, tx_hashes)
 
     return result
 
@@ -766,7 +1055,7 @@ def cmd_order_status(args):
             ),
             "settlement": _summarize_settlement(trades, []),
         }
-        print(json.dumps(result, indent=2))
+        _emit(result)
     except Exception as e:
         print(f"Error fetching order status: {e}", file=sys.stderr)
 
@@ -797,7 +1086,7 @@ def cmd_order_diagnose(args):
                 ),
                 "settlement": _summarize_settlement(trades, receipts),
             }
-            print(json.dumps(result, indent=2))
+            _emit(result)
             return
 
         watch_seconds = float(args.watch_seconds or 0)
@@ -845,7 +1134,7 @@ def cmd_order_diagnose(args):
             ),
             "settlement": _summarize_settlement(trades, receipts),
         }
-        print(json.dumps(last_result, indent=2))
+        _emit(last_result)
     except Exception as e:
         print(f"Error fetching order diagnosis: {e}", file=sys.stderr)
 
@@ -858,13 +1147,13 @@ def cmd_quote(args):
         payload = {
             "token_id": args.token_id,
             "best_bid": {
-                "price": float(best_bid.price),
+                "price": _order_price(best_bid),
                 "size": float(best_bid.size),
             }
             if best_bid
             else None,
             "best_ask": {
-                "price": float(best_ask.price),
+                "price": _order_price(best_ask),
                 "size": float(best_ask.size),
             }
             if best_ask
@@ -873,28 +1162,52 @@ def cmd_quote(args):
             "tick_size": book.tick_size,
             "last_trade_price": book.last_trade_price,
         }
-        print(json.dumps(payload, indent=2))
+        _emit(payload)
     except Exception as e:
         print(f"Error fetching quote: {e}", file=sys.stderr)
 
 
+def _decimal_arg(value, name):
+    try:
+        d = Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError(f"{name} must be a number") from None
+    if not d.is_finite():
+        raise ValueError(f"{name} must be a finite number")
+    return d
+
+
 def cmd_buy_max(args):
+    from py_clob_client.clob_types import OrderArgs, OrderType
+    from py_clob_client.order_builder.builder import ROUNDING_CONFIG
+    from py_clob_client.order_builder.constants import BUY
+
     client = get_client_or_exit(require_auth=True)
     try:
         book = client.get_order_book(args.token_id)
         best_bid, best_ask = _best_bid_ask(book)
-        price = float(args.price) if args.price else None
-        if price is None:
+        tick_size = str(book.tick_size or "0.01")
+        tick = _decimal_arg(tick_size, "tick_size")
+        if args.price:
+            # Snap down onto the tick grid so we never pay above --price.
+            price = _decimal_arg(args.price, "price").quantize(tick, rounding=ROUND_DOWN)
+            if price <= 0:
+                raise ValueError(f"price must be at least the tick size ({tick}).")
+        else:
             if not best_ask:
                 raise ValueError("No asks available for this token.")
-            price = float(best_ask.price)
+            price = _decimal_arg(best_ask.price, "best ask price")
 
-        cap = float(args.max_usd)
+        cap = _decimal_arg(args.max_usd, "max_usd")
         if cap <= 0:
             raise ValueError("max_usd must be > 0.")
 
-        min_size = float(book.min_order_size or 0)
-        size = cap / price
+        # Match the order builder's size precision so the checks below see the
+        # size that is actually posted.
+        round_config = ROUNDING_CONFIG.get(tick_size)
+        size_step = Decimal(1).scaleb(-round_config.size) if round_config else Decimal("0.000001")
+        min_size = _decimal_arg(book.min_order_size or 0, "min_order_size")
+        size = (cap / price).quantize(size_step, rounding=ROUND_DOWN)
         if min_size > 0 and size < min_size:
             min_cost = min_size * price
             if min_cost <= cap:
@@ -904,44 +1217,38 @@ def cmd_buy_max(args):
                     f"max_usd too low for min order size. "
                     f"min_cost=${min_cost:.4f} at price {price}."
                 )
+        if size <= 0:
+            raise ValueError(
+                f"max_usd too low: size rounds to 0 at price {price} (step {size_step})."
+            )
 
         # Marketable buy orders appear to require $1+ notional.
-        is_marketable = bool(best_ask) and price >= float(best_ask.price)
+        is_marketable = bool(best_ask) and price >= _decimal_arg(best_ask.price, "best ask price")
         notional = price * size
         if is_marketable and notional < 1:
             raise ValueError(
                 f"Marketable buy notional (${notional:.4f}) below $1 minimum."
             )
 
-        try:
-            bal = _get_balance_allowance(client)
-            balance = float(bal.get("balance", 0))
-            max_allow = _max_allowance(bal.get("allowances"))
-            if balance <= 0 or max_allow <= 0:
-                raise ValueError(
-                    "insufficient balance/allowance (balance or allowance is 0)"
-                )
-        except Exception as e:
-            print(
-                f"Warning: could not preflight balance/allowance: {e}",
-                file=sys.stderr,
-            )
+        if not args.no_preflight:
+            _preflight_balance_allowance(client)
 
-        size = round(size, 6)
         order_args = OrderArgs(
-            price=price,
-            size=size,
+            price=float(price),
+            size=float(size),
             side=BUY,
             token_id=args.token_id,
         )
         signed_order = client.create_order(order_args)
         resp = client.post_order(signed_order, OrderType.GTC)
-        print(json.dumps(resp, indent=2))
+        _emit(resp)
     except Exception as e:
         print(f"Error placing buy-max order: {e}", file=sys.stderr)
 
 
 def _balance_params_from_args(args):
+    from py_clob_client.clob_types import AssetType, BalanceAllowanceParams
+
     params = BalanceAllowanceParams()
     if args.asset_type:
         asset_type = args.asset_type.lower()
@@ -963,7 +1270,7 @@ def cmd_balance(args):
     try:
         params = _balance_params_from_args(args)
         resp = client.get_balance_allowance(params)
-        print(json.dumps(resp, indent=2))
+        _emit(resp)
     except Exception as e:
         print(f"Error fetching balance/allowance: {e}", file=sys.stderr)
 
@@ -973,7 +1280,7 @@ def cmd_refresh_balance(args):
     try:
         params = _balance_params_from_args(args)
         resp = client.update_balance_allowance(params)
-        print(json.dumps(resp, indent=2))
+        _emit(resp)
     except Exception as e:
         print(f"Error refreshing balance/allowance: {e}", file=sys.stderr)
 
@@ -990,12 +1297,14 @@ def cmd_whoami(args):
             "collateral": client.get_collateral_address(),
             "exchange": client.get_exchange_address(),
         }
-        print(json.dumps(payload, indent=2))
+        _emit(payload)
     except Exception as e:
         print(f"Error fetching identity: {e}", file=sys.stderr)
 
 
 def cmd_diagnose(args):
+    from py_clob_client.clob_types import BalanceAllowanceParams
+
     client = get_client_or_exit(require_auth=True)
     try:
         who = {
@@ -1020,13 +1329,7 @@ def cmd_diagnose(args):
             owner = who["funder"] or who["address"]
             token = who["collateral"]
             spenders = list((bal.get("allowances") or {}).keys()) or [who["exchange"]]
-            onchain = {}
-            for spender in spenders:
-                try:
-                    onchain[spender] = _rpc_allowance(rpc_url, owner, spender, token)
-                except Exception as e:
-                    onchain[spender] = f"error: {e}"
-            diag["onchain_allowances"] = onchain
+            diag["onchain_allowances"] = _rpc_allowance_many(rpc_url, owner, spenders, token)
 
         if args.fix:
             recs = []
@@ -1057,21 +1360,11 @@ def cmd_diagnose(args):
             diag["recommendations"] = recs
             diag["next_steps"] = steps
 
-        print(json.dumps(diag, indent=2))
+        _emit(diag)
     except Exception as e:
         print(f"Error running diagnose: {e}", file=sys.stderr)
 
-def main():
-    parser = argparse.ArgumentParser(description="Polymarket Trader CLI")
-    parser.add_argument(
-        "--version",
-        action="version",
-        version=f"%(prog)s {__version__}",
-    )
-    subparsers = parser.add_subparsers(dest="command")
-
-    # Markets
-    p_markets = subparsers.add_parser("markets")
+def _add_markets_args(p_markets):
     p_markets.add_argument("--id", help="Market/Token ID")
     p_markets.add_argument("--cursor", help="Pagination cursor")
     p_markets.add_argument(
@@ -1139,9 +1432,8 @@ def main():
         help="AI-friendly output (compact + default fields)",
     )
 
-    # Gamma (discovery/search)
-    p_gamma = subparsers.add_parser("gamma")
-    p_gamma.add_argument("path", help="Gamma API path, e.g. /events or /markets")
+
+def _add_gamma_args(p_gamma):
     p_gamma.add_argument("--param", action="append", help="Query param key=value (repeatable)")
     p_gamma.add_argument("--limit", type=int, help="Limit number of returned items")
     p_gamma.add_argument("--offset", type=int, help="Offset for pagination")
@@ -1163,110 +1455,47 @@ def main():
     p_gamma.add_argument("--end-within-hours", type=float, help="Filter by endDate within N hours")
     p_gamma.add_argument("--timeout", type=int, default=15, help="HTTP timeout seconds")
     p_gamma.add_argument("--ai", action="store_true", help="AI-friendly output (compact + default fields)")
-    p_gamma.set_defaults(func=cmd_gamma)
-
-    p_gamma_events = subparsers.add_parser("gamma-events")
-    p_gamma_events.add_argument("--param", action="append", help="Query param key=value (repeatable)")
-    p_gamma_events.add_argument("--limit", type=int, help="Limit number of returned items")
-    p_gamma_events.add_argument("--offset", type=int, help="Offset for pagination")
-    p_gamma_events.add_argument("--max-pages", type=int, help="Auto paginate up to N pages")
-    p_gamma_events.add_argument("--max-results", type=int, help="Cap total items returned")
-    p_gamma_events.add_argument("--order", help="Order parameter (if supported)")
-    p_gamma_events.add_argument("--q", help="Search string (mapped to --q-param)")
-    p_gamma_events.add_argument("--q-param", help="Query parameter name for --q")
-    p_gamma_events.add_argument("--q-try", help="Comma/space list of query param names to try")
-    p_gamma_events.add_argument("--fields", help="Comma-separated fields to keep in output items")
-    p_gamma_events.add_argument("--compact", action="store_true", help="Output a list of items only")
-    p_gamma_events.add_argument("--title-like", help="Filter by title/question/name substring")
-    p_gamma_events.add_argument("--title-any", help="Filter by any term in title (comma or space separated)")
-    p_gamma_events.add_argument("--title-all", help="Filter by all terms in title (comma or space separated)")
-    p_gamma_events.add_argument("--title-regex", help="Filter by title regex (case-insensitive)")
-    p_gamma_events.add_argument("--active-only", action="store_true", help="Only items with active=true")
-    p_gamma_events.add_argument("--open-only", action="store_true", help="Only items with closed=false")
-    p_gamma_events.add_argument("--not-archived", action="store_true", help="Only items with archived=false")
-    p_gamma_events.add_argument("--end-within-hours", type=float, help="Filter by endDate within N hours")
-    p_gamma_events.add_argument("--timeout", type=int, default=15, help="HTTP timeout seconds")
-    p_gamma_events.add_argument("--ai", action="store_true", help="AI-friendly output (compact + default fields)")
-    p_gamma_events.set_defaults(func=cmd_gamma, gamma_path="/events")
-
-    p_gamma_markets = subparsers.add_parser("gamma-markets")
-    p_gamma_markets.add_argument("--param", action="append", help="Query param key=value (repeatable)")
-    p_gamma_markets.add_argument("--limit", type=int, help="Limit number of returned items")
-    p_gamma_markets.add_argument("--offset", type=int, help="Offset for pagination")
-    p_gamma_markets.add_argument("--max-pages", type=int, help="Auto paginate up to N pages")
-    p_gamma_markets.add_argument("--max-results", type=int, help="Cap total items returned")
-    p_gamma_markets.add_argument("--order", help="Order parameter (if supported)")
-    p_gamma_markets.add_argument("--q", help="Search string (mapped to --q-param)")
-    p_gamma_markets.add_argument("--q-param", help="Query parameter name for --q")
-    p_gamma_markets.add_argument("--q-try", help="Comma/space list of query param names to try")
-    p_gamma_markets.add_argument("--fields", help="Comma-separated fields to keep in output items")
-    p_gamma_markets.add_argument("--compact", action="store_true", help="Output a list of items only")
-    p_gamma_markets.add_argument("--title-like", help="Filter by title/question/name substring")
-    p_gamma_markets.add_argument("--title-any", help="Filter by any term in title (comma or space separated)")
-    p_gamma_markets.add_argument("--title-all", help="Filter by all terms in title (comma or space separated)")
-    p_gamma_markets.add_argument("--title-regex", help="Filter by title regex (case-insensitive)")
-    p_gamma_markets.add_argument("--active-only", action="store_true", help="Only items with active=true")
-    p_gamma_markets.add_argument("--open-only", action="store_true", help="Only items with closed=false")
-    p_gamma_markets.add_argument("--not-archived", action="store_true", help="Only items with archived=false")
-    p_gamma_markets.add_argument("--end-within-hours", type=float, help="Filter by endDate within N hours")
-    p_gamma_markets.add_argument("--timeout", type=int, default=15, help="HTTP timeout seconds")
-    p_gamma_markets.add_argument("--ai", action="store_true", help="AI-friendly output (compact + default fields)")
-    p_gamma_markets.set_defaults(func=cmd_gamma, gamma_path="/markets")
-
-    p_gamma_search = subparsers.add_parser("gamma-search")
-    p_gamma_search.add_argument("--param", action="append", help="Query param key=value (repeatable)")
-    p_gamma_search.add_argument("--limit", type=int, help="Limit number of returned items")
-    p_gamma_search.add_argument("--offset", type=int, help="Offset for pagination")
-    p_gamma_search.add_argument("--max-pages", type=int, help="Auto paginate up to N pages")
-    p_gamma_search.add_argument("--max-results", type=int, help="Cap total items returned")
-    p_gamma_search.add_argument("--order", help="Order parameter (if supported)")
-    p_gamma_search.add_argument("--q", help="Search string (mapped to --q-param)")
-    p_gamma_search.add_argument("--q-param", help="Query parameter name for --q")
-    p_gamma_search.add_argument("--q-try", help="Comma/space list of query param names to try")
-    p_gamma_search.add_argument("--fields", help="Comma-separated fields to keep in output items")
-    p_gamma_search.add_argument("--compact", action="store_true", help="Output a list of items only")
-    p_gamma_search.add_argument("--title-like", help="Filter by title/question/name substring")
-    p_gamma_search.add_argument("--title-any", help="Filter by any term in title (comma or space separated)")
-    p_gamma_search.add_argument("--title-all", help="Filter by all terms in title (comma or space separated)")
-    p_gamma_search.add_argument("--title-regex", help="Filter by title regex (case-insensitive)")
-    p_gamma_search.add_argument("--active-only", action="store_true", help="Only items with active=true")
-    p_gamma_search.add_argument("--open-only", action="store_true", help="Only items with closed=false")
-    p_gamma_search.add_argument("--not-archived", action="store_true", help="Only items with archived=false")
-    p_gamma_search.add_argument("--end-within-hours", type=float, help="Filter by endDate within N hours")
-    p_gamma_search.add_argument("--timeout", type=int, default=15, help="HTTP timeout seconds")
-    p_gamma_search.add_argument("--ai", action="store_true", help="AI-friendly output (compact + default fields)")
-    p_gamma_search.set_defaults(func=cmd_gamma, gamma_path="/public-search")
-
-    # Orderbook
-    p_ob = subparsers.add_parser("orderbook")
-    p_ob.add_argument("token_id", help="Token ID")
-
-    # Buy
-    p_buy = subparsers.add_parser("buy")
+
+
+def _add_gamma_path_args(p_gamma):
+    p_gamma.add_argument("path", help="Gamma API path, e.g. /events or /markets")
+    _add_gamma_args(p_gamma)
+
+
+def _add_token_args(p):
+    p.add_argument("token_id", help="Token ID")
+
+
+def _add_buy_args(p_buy):
     p_buy.add_argument("token_id", help="Token ID")
     p_buy.add_argument("size", help="Size/Amount")
     p_buy.add_argument("price", help="Price (0.0 - 1.0)")
+    p_buy.add_argument(
+        "--no-preflight",
+        action="store_true",
+        help="Skip the balance/allowance check before posting",
+    )
+
 
-    # Sell
-    p_sell = subparsers.add_parser("sell")
+def _add_sell_args(p_sell):
     p_sell.add_argument("token_id", help="Token ID")
     p_sell.add_argument("size", help="Size/Amount")
     p_sell.add_argument("price", help="Price (0.0 - 1.0)")
 
-    # Cancel
-    p_cancel = subparsers.add_parser("cancel")
+
+def _add_cancel_args(p_cancel):
     p_cancel.add_argument("--order-id", help="Order ID to cancel")
     p_cancel.add_argument("--all", action="store_true", help="Cancel all orders")
 
-    # Order status
-    p_order_status = subparsers.add_parser("order-status")
+
+def _add_order_status_args(p_order_status):
     p_order_status.add_argument("--order-id", required=True, help="Order ID to inspect")
     p_order_status.add_argument(
         "--no-trades", action="store_true", help="Skip fetching associated trades"
     )
 
-    # Order diagnose (advanced)
-    p_order_diag = subparsers.add_parser("order-diagnose")
+
+def _add_order_diagnose_args(p_order_diag):
     p_order_diag.add_argument("--order-id", required=True, help="Order ID to inspect")
     p_order_diag.add_argument(
         "--no-trades", action="store_true", help="Skip fetching associated trades"
@@ -1286,37 +1515,32 @@ def main():
         "--watch-interval", type=float, help="Seconds between polls (default 10)"
     )
 
-    # Quote
-    p_quote = subparsers.add_parser("quote")
-    p_quote.add_argument("token_id", help="Token ID")
 
-    # Buy max
-    p_buy_max = subparsers.add_parser("buy-max")
+def _add_buy_max_args(p_buy_max):
     p_buy_max.add_argument("token_id", help="Token ID")
     p_buy_max.add_argument("max_usd", help="Max USD notional")
     p_buy_max.add_argument(
         "--price",
         help="Limit price; if omitted uses best ask (marketable).",
     )
+    p_buy_max.add_argument(
+        "--no-preflight",
+        action="store_true",
+        help="Skip the balance/allowance check before posting",
+    )
 
-    # Balance/allowance
-    p_bal = subparsers.add_parser("balance")
+
+def _add_balance_args(p_bal):
     p_bal.add_argument("--asset-type", help="collateral or conditional")
     p_bal.add_argument("--token-id", help="Token ID")
     p_bal.add_argument("--signature-type", type=int, help="Override signature type")
 
-    p_bal_refresh = subparsers.add_parser("refresh-balance")
-    p_bal_refresh.add_argument("--asset-type", help="collateral or conditional")
-    p_bal_refresh.add_argument("--token-id", help="Token ID")
-    p_bal_refresh.add_argument(
-        "--signature-type", type=int, help="Override signature type"
-    )
 
-    # Whoami
-    p_who = subparsers.add_parser("whoami")
+def _add_no_args(p):
+    pass
 
-    # Diagnose
-    p_diag = subparsers.add_parser("diagnose")
+
+def _add_diagnose_args(p_diag):
     p_diag.add_argument(
         "--onchain",
         action="store_true",
@@ -1328,40 +1552,57 @@ def main():
         help="Attempt refresh-balance and output recommendations",
     )
 
-    args = parser.parse_args()
+
+# name -> (argument builder, handler, extra defaults)
+_COMMANDS = {
+    "markets": (_add_markets_args, cmd_markets, {}),
+    "gamma": (_add_gamma_path_args, cmd_gamma, {}),
+    "gamma-events": (_add_gamma_args, cmd_gamma, {"gamma_path": "/events"}),
+    "gamma-markets": (_add_gamma_args, cmd_gamma, {"gamma_path": "/markets"}),
+    "gamma-search": (_add_gamma_args, cmd_gamma, {"gamma_path": "/public-search"}),
+    "orderbook": (_add_token_args, cmd_orderbook, {}),
+    "buy": (_add_buy_args, cmd_buy, {}),
+    "sell": (_add_sell_args, cmd_sell, {}),
+    "cancel": (_add_cancel_args, cmd_cancel, {}),
+    "order-status": (_add_order_status_args, cmd_order_status, {}),
+    "order-diagnose": (_add_order_diagnose_args, cmd_order_diagnose, {}),
+    "quote": (_add_token_args, cmd_quote, {}),
+    "buy-max": (_add_buy_max_args, cmd_buy_max, {}),
+    "balance": (_add_balance_args, cmd_balance, {}),
+    "refresh-balance": (_add_balance_args, cmd_refresh_balance, {}),
+    "whoami": (_add_no_args, cmd_whoami, {}),
+    "diagnose": (_add_diagnose_args, cmd_diagnose, {}),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Polymarket Trader CLI")
+    parser.add_argument(
+        "--version",
+        action="version",
+        version=f"%(prog)s {__version__}",
+    )
+    subparsers = parser.add_subparsers(dest="command")
+
+    argv = sys.argv[1:]
+    selected = argv[0] if argv and argv[0] in _COMMANDS else None
+    for name, (add_args, func, defaults) in _COMMANDS.items():
+        sub = subparsers.add_parser(name)
+        # Only the invoked command needs its arguments; the rest are listed for help.
+        if selected is None or name == selected:
+            add_args(sub)
+        sub.set_defaults(func=func, **defaults)
+
+    args = parser.parse_args(argv)
+    # Load once for every command (gamma* never builds a client); later
+    # load_env_file() calls from get_client are cached no-ops.
+    load_env_file()
 
     if hasattr(args, "func"):
         args.func(args)
         return
 
-    if args.command == "markets":
-        cmd_markets(args)
-    elif args.command == "orderbook":
-        cmd_orderbook(args)
-    elif args.command == "buy":
-        cmd_buy(args)
-    elif args.command == "sell":
-        cmd_sell(args)
-    elif args.command == "cancel":
-        cmd_cancel(args)
-    elif args.command == "order-status":
-        cmd_order_status(args)
-    elif args.command == "order-diagnose":
-        cmd_order_diagnose(args)
-    elif args.command == "quote":
-        cmd_quote(args)
-    elif args.command == "buy-max":
-        cmd_buy_max(args)
-    elif args.command == "balance":
-        cmd_balance(args)
-    elif args.command == "refresh-balance":
-        cmd_refresh_balance(args)
-    elif args.command == "whoami":
-        cmd_whoami(args)
-    elif args.command == "diagnose":
-        cmd_diagnose(args)
-    else:
-        parser.print_help()
+    parser.print_help()
 
 if __name__ == "__main__":
     main()
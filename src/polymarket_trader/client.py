@@ -1,12 +1,15 @@
+import functools
 import os
 import sys
 
-from py_clob_client.client import ClobClient
-
 from .config import env_int, load_env_file
 
 
+@functools.lru_cache(maxsize=None)
 def get_client(require_auth):
+    # Deferred: py_clob_client pulls in the web3 stack, which dominates startup.
+    from py_clob_client.client import ClobClient
+
     load_env_file()
     host = os.getenv("POLYMARKET_HOST", "https://clob.polymarket.com")
     chain_id = env_int("POLYMARKET_CHAIN_ID") or 137  # Polygon
@@ -43,7 +46,7 @@ def get_client(require_auth):
 
 def get_client_or_exit(require_auth):
     try:
-        return get_client(require_auth)
+        return get_client(bool(require_auth))
     except Exception as exc:
         print(f"Error: {exc}", file=sys.stderr)
         sys.exit(1)
@@ -1,8 +1,17 @@
+import functools
 import os
+import re
 
 DEFAULT_ENV_PATH = "~/.polymarket.env"
+# Mirrors the former line-by-line parser: skip comment lines, drop a leading
+# "export " (single space, as before) and split on the first "=". An empty
+# key (e.g. "export =x") matches here and is skipped by the caller.
+_ENV_LINE_RE = re.compile(
+    r"^(?![^\S\n]*#)[^\S\n]*(?:export [^\S\n]*)?([^\n=]*)=(.*)$", re.M
+)
 
 
+@functools.lru_cache(maxsize=None)
 def load_env_file(path=None):
     env_path = path or os.getenv("POLYMARKET_ENV_FILE") or DEFAULT_ENV_PATH
     env_path = os.path.expanduser(env_path)
@@ -10,20 +19,13 @@ def load_env_file(path=None):
         return
     try:
         with open(env_path, "r", encoding="utf-8") as f:
-            for raw in f:
-                line = raw.strip()
-                if not line or line.startswith("#"):
-                    continue
-                if line.startswith("export "):
-                    line = line[len("export ") :].strip()
-                if "=" not in line:
-                    continue
-                key, value = line.split("=", 1)
-                key = key.strip()
-                value = value.strip().strip("\"'").strip()
-                if key and value:
-                    # Allow file to override existing env values for automation
-                    os.environ[key] = value
+            data = f.read()
+        for match in _ENV_LINE_RE.finditer(data):
+            key = match.group(1).strip()
+            value = match.group(2).strip().strip("\"'").strip()
+            if key and value:
+                # Allow file to override existing env values for automation
+                os.environ[key] = value
     except Exception:
         # Silent failure to avoid leaking secrets in error output
         pass